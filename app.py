@@ -4,10 +4,36 @@ import pandas as pd
 import json
 from datetime import datetime
 import os
-from dataclasses import dataclass
+import logging
+import threading
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from typing import List, Dict
-import plotly.express as px
-import plotly.graph_objects as go
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _loads(data):
+    """Parse JSON from bytes, using orjson when available"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def _dumps(data, indent=False):
+    """Serialize to JSON bytes, using orjson when available"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, indent=2).encode()
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def _parse_dates(frame):
+    if not frame.empty:
+        frame["date"] = pd.to_datetime(frame["date"], format="%Y-%m-%d")
+    return frame
 
 # Data Classes
 @dataclass
@@ -35,54 +61,161 @@ class Customer:
     vehicle_model: str = ""
     email: str = ""
 
+# Column order and C-level row extractors for building frames
+PART_COLUMNS = [f.name for f in fields(Part)]
+SERVICE_COLUMNS = [f.name for f in fields(Service)]
+_part_getter = operator.attrgetter(*PART_COLUMNS)
+_service_getter = operator.attrgetter(*SERVICE_COLUMNS)
+
 class AutoRepairShop:
     def __init__(self):
         self.parts = {}
         self.services = {}
         self.customers = {}
         self.invoices = []
+        self._version = 0
+        self._parts_lines_df = self._svc_lines_df = None
+        self._lines_version = None
+        self._dirty = set()
+        # The shop is shared by every session's script thread
+        self.lock = threading.RLock()
+        os.makedirs('data', exist_ok=True)
         self.load_data()
 
+    def _refresh_lines(self):
+        """Re-flatten invoice line items if the data changed since the last build"""
+        with self.lock:
+            if self._lines_version == self._version:
+                return
+            self._parts_lines_df = _parse_dates(
+                pd.json_normalize(self.invoices, record_path="parts", meta=["date"],
+                                  errors="ignore"))
+            self._svc_lines_df = _parse_dates(
+                pd.json_normalize(self.invoices, record_path="services", meta=["date"],
+                                  errors="ignore"))
+            self._lines_version = self._version
+
+    @property
+    def parts_lines(self):
+        """Part line items of all invoices, one row per line"""
+        self._refresh_lines()
+        return self._parts_lines_df
+
+    @property
+    def service_lines(self):
+        """Service line items of all invoices, one row per line"""
+        self._refresh_lines()
+        return self._svc_lines_df
+
+    @staticmethod
+    def _read(filepath):
+        """Return the raw bytes of a data file, or None if it does not exist"""
+        try:
+            with open(filepath, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
     def load_data(self):
         """Load data from JSON files"""
-        if not os.path.exists('data'):
-            os.makedirs('data')
-            
         files = {
             'parts.json': (self.parts, Part),
             'services.json': (self.services, Service),
-            'customers.json': (self.customers, Customer),
-            'invoices.json': self.invoices
+            'customers.json': (self.customers, Customer)
         }
         
+        # The files are independent, so read them concurrently
+        filenames = [*files, 'invoices.jsonl']
+        with ThreadPoolExecutor(max_workers=len(filenames)) as pool:
+            blobs = dict(zip(filenames, pool.map(self._read, [f"data/{name}" for name in filenames])))
+        
         for filename, (container, cls) in files.items():
-            filepath = f"data/{filename}"
-            try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                    if filename != 'invoices.json':
-                        container.update({id: cls(**item) for id, item in data.items()})
-                    else:
-                        self.invoices = data
-            except FileNotFoundError:
-                if not self.parts and not self.services:
-                    self.initialize_sample_data()
-
-    def save_data(self):
-        """Save data to JSON files"""
-        if not os.path.exists('data'):
-            os.makedirs('data')
-            
-        data_mapping = {
-            'parts.json': {id: vars(part) for id, part in self.parts.items()},
-            'services.json': {id: vars(service) for id, service in self.services.items()},
-            'customers.json': {id: vars(customer) for id, customer in self.customers.items()},
-            'invoices.json': self.invoices
+            if blobs[filename] is not None:
+                data = _loads(blobs[filename])
+                container.update({id: cls(**item) for id, item in data.items()})
+            elif not self.parts and not self.services:
+                self.initialize_sample_data()
+
+        if blobs['invoices.jsonl'] is not None:
+            self.load_invoices(blobs['invoices.jsonl'])
+        else:
+            self.migrate_invoices()
+
+    def load_invoices(self, blob):
+        """Parse the invoice log, dropping a final line left half-written by an interrupted append"""
+        lines = [line for line in blob.splitlines() if line.strip()]
+        self.invoices.extend(_loads(line) for line in lines[:-1])
+        if not lines:
+            return
+        try:
+            self.invoices.append(_loads(lines[-1]))
+        except ValueError:
+            logger.warning("Dropping truncated last line of data/invoices.jsonl")
+            with open('data/invoices.jsonl', 'wb') as f:
+                f.write(b"".join(line + b"\n" for line in lines[:-1]))
+
+    def migrate_invoices(self):
+        """One-time conversion of the legacy invoices.json array to the invoices.jsonl log"""
+        try:
+            with open('data/invoices.json', 'rb') as f:
+                legacy = _loads(f.read())
+        except FileNotFoundError:
+            return
+        self.invoices.extend(legacy)
+        with open('data/invoices.jsonl', 'wb') as f:
+            f.write(b"".join(_dumps(invoice) + b"\n" for invoice in self.invoices))
+
+    def _write_json(self, filename, data, pretty=False):
+        """Rewrite a single collection file"""
+        with open(f'data/{filename}', 'wb') as f:
+            f.write(_dumps(data, indent=pretty))
+
+    def save_parts(self, pretty=False):
+        self._write_json('parts.json', {id: vars(part) for id, part in self.parts.items()}, pretty)
+
+    def save_services(self, pretty=False):
+        self._write_json('services.json', {id: vars(service) for id, service in self.services.items()}, pretty)
+
+    def save_customers(self, pretty=False):
+        self._write_json('customers.json', {id: vars(customer) for id, customer in self.customers.items()}, pretty)
+
+    def append_invoice(self, invoice):
+        """Record an invoice and append it to the invoice log"""
+        with self.lock:
+            self.invoices.append(invoice)
+            self._version += 1
+            with open('data/invoices.jsonl', 'ab') as f:
+                f.write(_dumps(invoice) + b"\n")
+
+    def add_part(self, part):
+        with self.lock:
+            self.parts[part.id] = part
+            self._version += 1
+            self._dirty.add('parts')
+
+    def add_service(self, service):
+        with self.lock:
+            self.services[service.id] = service
+            self._version += 1
+            self._dirty.add('services')
+
+    def add_customer(self, customer):
+        with self.lock:
+            self.customers[customer.id] = customer
+            self._version += 1
+            self._dirty.add('customers')
+
+    def save_data(self, pretty=False):
+        """Save the collections changed since the last save (indented if pretty)"""
+        savers = {
+            'parts': self.save_parts,
+            'services': self.save_services,
+            'customers': self.save_customers
         }
-        
-        for filename, data in data_mapping.items():
-            with open(f'data/{filename}', 'w') as f:
-                json.dump(data, f, indent=2)
+        with self.lock:
+            for name in self._dirty:
+                savers[name](pretty)
+            self._dirty.clear()
 
     def initialize_sample_data(self):
         """Initialize sample data"""
@@ -102,16 +235,115 @@ class AutoRepairShop:
         for service in sample_services:
             self.services[service.id] = service
 
-# Initialize session state
-if 'shop' not in st.session_state:
-    st.session_state.shop = AutoRepairShop()
-
-def save_data():
-    st.session_state.shop.save_data()
+        # Mark the samples dirty so the next save persists them alongside any change
+        self._dirty.update({'parts', 'services'})
 
 # Streamlit UI
 st.set_page_config(page_title="Auto Repair Shop Management", layout="wide")
 
+# Shared shop instance (built once per server process)
+@st.cache_resource
+def get_shop():
+    return AutoRepairShop()
+
+shop = get_shop()
+
+# Cached table views (keyed on the shop version only)
+PART_DTYPES = {"id": "string[pyarrow]", "name": "string[pyarrow]", "price": "float64", "quantity": "int64", "reorder_level": "int64", "tax_rate": "float64"}
+SERVICE_DTYPES = {"id": "string[pyarrow]", "name": "string[pyarrow]", "base_price": "float64", "tax_rate": "float64"}
+
+@st.cache_data
+def parts_df(version, _parts):
+    return pd.DataFrame.from_records(
+        map(_part_getter, _parts.values()),
+        columns=PART_COLUMNS).astype(PART_DTYPES)
+
+@st.cache_data
+def services_df(version, _services):
+    return pd.DataFrame.from_records(
+        map(_service_getter, _services.values()),
+        columns=SERVICE_COLUMNS).astype(SERVICE_DTYPES)
+
+@st.cache_data
+def compute_low_stock(version, _parts):
+    parts = parts_df(version, _parts)
+    mask = parts["quantity"].values <= parts["reorder_level"].values
+    return list(parts.loc[mask, ["name", "quantity", "reorder_level"]].itertuples(index=False, name=None))
+
+@st.cache_data
+def invoices_df(version, _invoices):
+    return _parse_dates(pd.DataFrame(_invoices, columns=["date", "total", "tax"]))
+
+def filter_by_date(frame, start_date, end_date):
+    """Keep rows whose invoice date falls within [start_date, end_date]"""
+    if frame.empty:
+        return frame
+    dates = frame["date"]
+    return frame[(dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))]
+
+# Reports page (reruns on its own when its widgets change)
+@st.fragment
+def reports_page(shop):
+    import plotly.express as px  # only needed here; keeps it off the startup path
+
+    st.title("Reports")
+    
+    report_type = st.selectbox(
+        "Select Report Type",
+        ["Sales Summary", "Popular Items", "Service Popularity"]
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("Start Date")
+    with col2:
+        end_date = st.date_input("End Date")
+    
+    if st.button("Generate Report"):
+        if report_type == "Sales Summary":
+            # Calculate sales summary
+            inv_df = filter_by_date(
+                invoices_df(shop._version, shop.invoices), start_date, end_date)
+            total_sales, total_tax = inv_df[["total", "tax"]].sum()
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Total Sales", f"${total_sales:.2f}")
+            with col2:
+                st.metric("Total Tax", f"${total_tax:.2f}")
+            with col3:
+                st.metric("Total Invoices", len(inv_df))
+                
+        elif report_type == "Popular Items":
+            # Calculate popular items
+            parts_lines = filter_by_date(shop.parts_lines, start_date, end_date)
+            
+            if not parts_lines.empty:
+                part_sales = parts_lines.groupby("name")["quantity"].sum()
+                fig = px.bar(
+                    x=part_sales.index,
+                    y=part_sales.values,
+                    title="Popular Items"
+                )
+                st.plotly_chart(fig)
+            else:
+                st.info("No sales data available")
+                
+        elif report_type == "Service Popularity":
+            # Calculate service popularity
+            svc_lines = filter_by_date(shop.service_lines, start_date, end_date)
+            
+            if not svc_lines.empty:
+                service_count = svc_lines.groupby("name").size()
+                fig = px.pie(
+                    values=service_count.values,
+                    names=service_count.index,
+                    title="Service Popularity"
+                )
+                st.plotly_chart(fig)
+            else:
+                st.info("No service data available")
+
 # Sidebar navigation
 st.sidebar.title("Navigation")
 page = st.sidebar.selectbox("Choose a page", 
@@ -125,18 +357,17 @@ if page == "Dashboard":
     
     with col1:
         st.subheader("Quick Stats")
-        st.write(f"Total Parts: {len(st.session_state.shop.parts)}")
-        st.write(f"Total Services: {len(st.session_state.shop.services)}")
-        st.write(f"Total Customers: {len(st.session_state.shop.customers)}")
-        st.write(f"Total Invoices: {len(st.session_state.shop.invoices)}")
+        st.write(f"Total Parts: {len(shop.parts)}")
+        st.write(f"Total Services: {len(shop.services)}")
+        st.write(f"Total Customers: {len(shop.customers)}")
+        st.write(f"Total Invoices: {len(shop.invoices)}")
 
     with col2:
         st.subheader("Low Stock Alerts")
-        low_stock = [part for part in st.session_state.shop.parts.values() 
-                    if part.quantity <= part.reorder_level]
+        low_stock = compute_low_stock(shop._version, shop.parts)
         if low_stock:
-            for part in low_stock:
-                st.warning(f"{part.name}: {part.quantity} remaining (Reorder at {part.reorder_level})")
+            for name, quantity, reorder_level in low_stock:
+                st.warning(f"{name}: {quantity} remaining (Reorder at {reorder_level})")
         else:
             st.success("No items are low in stock")
 
@@ -147,9 +378,8 @@ elif page == "Inventory":
     tab1, tab2 = st.tabs(["View Inventory", "Add New Part"])
     
     with tab1:
-        if st.session_state.shop.parts:
-            parts_df = pd.DataFrame([vars(part) for part in st.session_state.shop.parts.values()])
-            st.dataframe(parts_df)
+        if shop.parts:
+            st.dataframe(parts_df(shop._version, shop.parts), hide_index=True, use_container_width=True)
         else:
             st.info("No parts in inventory")
     
@@ -164,9 +394,10 @@ elif page == "Inventory":
             
             if st.form_submit_button("Add Part"):
                 if part_id and name:
-                    st.session_state.shop.parts[part_id] = Part(
-                        part_id, name, price, quantity, reorder_level, tax_rate)
-                    save_data()
+                    with shop.lock:
+                        shop.add_part(Part(
+                            part_id, name, price, quantity, reorder_level, tax_rate))
+                        shop.save_data()
                     st.success("Part added successfully!")
                 else:
                     st.error("Please fill in all required fields")
@@ -178,9 +409,8 @@ elif page == "Services":
     tab1, tab2 = st.tabs(["View Services", "Add New Service"])
     
     with tab1:
-        if st.session_state.shop.services:
-            services_df = pd.DataFrame([vars(service) for service in st.session_state.shop.services.values()])
-            st.dataframe(services_df)
+        if shop.services:
+            st.dataframe(services_df(shop._version, shop.services), hide_index=True, use_container_width=True)
         else:
             st.info("No services available")
     
@@ -193,73 +423,14 @@ elif page == "Services":
             
             if st.form_submit_button("Add Service"):
                 if service_id and name:
-                    st.session_state.shop.services[service_id] = Service(
-                        service_id, name, base_price, tax_rate)
-                    save_data()
+                    with shop.lock:
+                        shop.add_service(Service(
+                            service_id, name, base_price, tax_rate))
+                        shop.save_data()
                     st.success("Service added successfully!")
                 else:
                     st.error("Please fill in all required fields")
 
 # Reports
 elif page == "Reports":
-    st.title("Reports")
-    
-    report_type = st.selectbox(
-        "Select Report Type",
-        ["Sales Summary", "Popular Items", "Service Popularity"]
-    )
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        start_date = st.date_input("Start Date")
-    with col2:
-        end_date = st.date_input("End Date")
-    
-    if st.button("Generate Report"):
-        if report_type == "Sales Summary":
-            # Calculate sales summary
-            total_sales = sum(invoice["total"] for invoice in st.session_state.shop.invoices)
-            total_tax = sum(invoice["tax"] for invoice in st.session_state.shop.invoices)
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Sales", f"${total_sales:.2f}")
-            with col2:
-                st.metric("Total Tax", f"${total_tax:.2f}")
-            with col3:
-                st.metric("Total Invoices", len(st.session_state.shop.invoices))
-                
-        elif report_type == "Popular Items":
-            # Calculate popular items
-            part_sales = {}
-            for invoice in st.session_state.shop.invoices:
-                for part in invoice["parts"]:
-                    part_sales[part["name"]] = part_sales.get(part["name"], 0) + part["quantity"]
-            
-            if part_sales:
-                fig = px.bar(
-                    x=list(part_sales.keys()),
-                    y=list(part_sales.values()),
-                    title="Popular Items"
-                )
-                st.plotly_chart(fig)
-            else:
-                st.info("No sales data available")
-                
-        elif report_type == "Service Popularity":
-            # Calculate service popularity
-            service_count = {}
-            for invoice in st.session_state.shop.invoices:
-                for service in invoice["services"]:
-                    service_count[service["name"]] = service_count.get(service["name"], 0) + 1
-            
-            if service_count:
-                fig = px.pie(
-                    values=list(service_count.values()),
-                    names=list(service_count.keys()),
-                    title="Service Popularity"
-                )
-                st.plotly_chart(fig)
-            else:
-                st.info("No service data available")
-
+    reports_page(shop)